@@ -5,10 +5,13 @@ add_meme.py
 Usage:
     python add_meme.py /path/to/image.jpg memes
     python add_meme.py /path/to/image.png calm
+    python add_meme.py /path/to/a.jpg /path/to/b.png memes
 
 Behavior:
 - Copies the given image into media/memes/ or media/calm/
+  (hardlinked when on the same filesystem, otherwise a plain byte copy)
 - Auto-renames to positive_001.jpg, positive_002.jpg, ... or calm_001.jpg, ...
+- Several files can be given at once; they are registered in one transaction
 - Logs the entry to meme_library.db (SQLite) with columns:
     id, filename, category, original_name, added_at
 
@@ -16,10 +19,12 @@ Standard library only.
 """
 
 import argparse
+import functools
 import os
 import shutil
 import sqlite3
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 import re
 import sys
@@ -30,11 +35,31 @@ CATEGORY_MAP = {
     "memes": {"subdir": "memes", "prefix": "positive"},
     "calm": {"subdir": "calm", "prefix": "calm"},
 }
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".gif", ".webp"})
+# WAL + NORMAL sync: one fsync per checkpoint instead of per commit
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+)
 
 
-def init_db(db_path: Path):
-    conn = sqlite3.connect(str(db_path))
-    cur = conn.cursor()
+def utc_timestamp() -> str:
+    """Current UTC time as ISO 8601 with second precision"""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def connect_db(db_path: Path):
+    """Open the library DB in autocommit mode with tuned PRAGMAs"""
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def init_db(cur):
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS meme_library (
@@ -46,96 +71,219 @@ def init_db(db_path: Path):
         )
         """
     )
-    conn.commit()
-    return conn
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_meme_library_category ON meme_library (category, filename)"
+    )
 
 
-def next_filename(dest_dir: Path, prefix: str, ext: str) -> str:
-    """Find next available filename like prefix_001.ext"""
-    pattern = re.compile(rf"^{re.escape(prefix)}_(\d{{3}})\{re.escape(ext)}$", re.IGNORECASE)
+def place_file(src_path: Path, dest_path: Path):
+    """Hardlink src to dest; copy only the bytes if linking is not possible"""
+    try:
+        os.link(src_path, dest_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # EXDEV (other filesystem) or no hardlink support; copyfile uses the
+        # kernel fast path where available and skips copy2's metadata pass
+        shutil.copyfile(src_path, dest_path)
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_re(prefix: str, ext: str):
+    """Compiled prefix_NNN.ext matcher, built once per (prefix, ext)"""
+    return re.compile(rf"^{re.escape(prefix)}_(\d{{3}}){re.escape(ext)}$", re.IGNORECASE)
+
+
+def max_dir_index(dest_dir: Path, prefix: str, ext: str) -> int:
+    """Highest NNN among prefix_NNN.ext files in dest_dir (0 if none)"""
+    pattern = _prefix_re(prefix, ext)
     max_idx = 0
-    for p in dest_dir.iterdir():
-        if not p.is_file():
-            continue
-        m = pattern.match(p.name)
-        if m:
-            try:
-                idx = int(m.group(1))
-                if idx > max_idx:
-                    max_idx = idx
-            except ValueError:
+    # scandir reuses the directory entry type instead of a stat() per file
+    with os.scandir(dest_dir) as entries:
+        for entry in entries:
+            m = pattern.match(entry.name)
+            if not m or not entry.is_file():
                 continue
-    next_idx = max_idx + 1
+            idx = int(m.group(1))
+            if idx > max_idx:
+                max_idx = idx
+    return max_idx
+
+
+def max_db_index(cur, category: str, prefix: str, ext: str):
+    """Highest NNN among registered prefix_NNN.ext files (None if none registered)"""
+    def esc(text):
+        return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    # prefix, literal "_", exactly three characters, ext
+    like = f"{esc(prefix)}\\____{esc(ext)}"
+    cur.execute(
+        """
+        SELECT MAX(CAST(substr(filename, ?, 3) AS INTEGER)) FROM meme_library
+        WHERE category = ? AND filename LIKE ? ESCAPE '\\'
+        """,
+        (len(prefix) + 2, category, like),
+    )
+    return cur.fetchone()[0]
+
+
+def next_filename(dest_dir: Path, prefix: str, ext: str) -> str:
+    """Find next available filename like prefix_001.ext"""
+    next_idx = max_dir_index(dest_dir, prefix, ext) + 1
     return f"{prefix}_{next_idx:03d}{ext}"
 
 
-def copy_and_register(src_path: Path, category: str):
-    if category not in CATEGORY_MAP:
-        raise ValueError(f"Invalid category: {category}. Must be one of: {', '.join(CATEGORY_MAP.keys())}")
-
-    src_path = src_path.expanduser().resolve()
-    if not src_path.exists() or not src_path.is_file():
-        raise FileNotFoundError(f"Source file not found: {src_path}")
-
-    info = CATEGORY_MAP[category]
-    dest_dir = MEDIA_DIR / info["subdir"]
-    dest_dir.mkdir(parents=True, exist_ok=True)
-
-    ext = src_path.suffix.lower()
-    if not ext:
-        ext = ".jpg"
-
-    # sanitize extension to common image types, default to .jpg
-    if ext not in (".jpg", ".jpeg", ".png", ".gif", ".webp"):
-        ext = ".jpg"
-
-    prefix = info["prefix"]
-
-    new_name = next_filename(dest_dir, prefix, ext)
-    dest_path = dest_dir / new_name
-
-    # Ensure unique (in very rare race)
-    while dest_path.exists():
-        # increment
-        m = re.search(r"_(\d{3})\.", dest_path.name)
-        if m:
-            idx = int(m.group(1)) + 1
-        else:
-            idx = 1
+class MemeIngester:
+    """Copies images into the media library over one long-lived DB connection"""
+
+    def __init__(self, db_path: Path = Path(DB_NAME)):
+        self.conn = connect_db(db_path)
+        with self.transaction() as cur:
+            init_db(cur)
+        # Last index handed out per (category, prefix, ext) during this run
+        self._last_idx = {}
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT; rolls back if the block raises"""
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            yield cur
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        cur.execute("COMMIT")
+
+    def close(self):
+        self.conn.close()
+
+    def _next_index(self, category: str, dest_dir: Path, prefix: str, ext: str) -> int:
+        """Next free NNN: from this run's counter, else the DB, else a directory scan"""
+        key = (category, prefix, ext)
+        if key in self._last_idx:
+            return self._last_idx[key] + 1
+
+        max_idx = max_db_index(self.conn.cursor(), category, prefix, ext)
+        if max_idx is None:
+            # Nothing registered yet: reconcile with files already on disk
+            max_idx = max_dir_index(dest_dir, prefix, ext)
+        return max_idx + 1
+
+    def _copy_into_library(self, src_path: Path, category: str):
+        """Copy src into its category folder; returns (dest_path, new_name, original_name)"""
+        if category not in CATEGORY_MAP:
+            raise ValueError(f"Invalid category: {category}. Must be one of: {', '.join(CATEGORY_MAP.keys())}")
+
+        src_path = src_path.expanduser().resolve()
+        if not src_path.exists() or not src_path.is_file():
+            raise FileNotFoundError(f"Source file not found: {src_path}")
+
+        info = CATEGORY_MAP[category]
+        dest_dir = MEDIA_DIR / info["subdir"]
+        dest_dir.mkdir(parents=True, exist_ok=True)
+
+        ext = src_path.suffix.lower()
+        if not ext:
+            ext = ".jpg"
+
+        # sanitize extension to common image types, default to .jpg
+        if ext not in IMAGE_EXTENSIONS:
+            ext = ".jpg"
+
+        prefix = info["prefix"]
+
+        idx = self._next_index(category, dest_dir, prefix, ext)
         new_name = f"{prefix}_{idx:03d}{ext}"
         dest_path = dest_dir / new_name
 
-    shutil.copy2(str(src_path), str(dest_path))
+        # Ensure unique (unregistered files or a concurrent run)
+        while dest_path.exists():
+            idx += 1
+            new_name = f"{prefix}_{idx:03d}{ext}"
+            dest_path = dest_dir / new_name
 
-    # Insert into DB
-    db_path = Path(DB_NAME)
-    conn = init_db(db_path)
-    cur = conn.cursor()
-    added_at = datetime.utcnow().isoformat() + "Z"
-    cur.execute(
-        "INSERT INTO meme_library (filename, category, original_name, added_at) VALUES (?, ?, ?, ?)",
-        (new_name, category, src_path.name, added_at),
-    )
-    conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
+        place_file(src_path, dest_path)
+        self._last_idx[(category, prefix, ext)] = idx
+
+        return dest_path, new_name, src_path.name
 
-    return new_id, dest_path, new_name
+    def copy_and_register(self, src_path: Path, category: str):
+        dest_path, new_name, original_name = self._copy_into_library(src_path, category)
+
+        # Insert into DB; joins the caller's transaction if one is open
+        cur = self.conn.cursor()
+        added_at = utc_timestamp()
+        cur.execute(
+            "INSERT INTO meme_library (filename, category, original_name, added_at) VALUES (?, ?, ?, ?)",
+            (new_name, category, original_name, added_at),
+        )
+        new_id = cur.lastrowid
+
+        return new_id, dest_path, new_name
+
+    def add_many(self, src_paths, category: str):
+        """
+        Copy several images and register them with a single executemany.
+
+        Returns a list of (id, dest_path, new_name) in input order. If anything
+        fails, the transaction is rolled back and already-copied files removed.
+        """
+        copied = []
+        rows = []
+        added_at = utc_timestamp()
+        try:
+            for src_path in src_paths:
+                dest_path, new_name, original_name = self._copy_into_library(src_path, category)
+                copied.append((dest_path, new_name))
+                rows.append((new_name, category, original_name, added_at))
+
+            with self.transaction() as cur:
+                cur.executemany(
+                    "INSERT INTO meme_library (filename, category, original_name, added_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                # Writer lock is held, so AUTOINCREMENT ids are consecutive
+                last_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+        except Exception:
+            for dest_path, _ in copied:
+                dest_path.unlink(missing_ok=True)
+            raise
+
+        first_id = last_id - len(rows) + 1
+        return [
+            (first_id + i, dest_path, new_name)
+            for i, (dest_path, new_name) in enumerate(copied)
+        ]
+
+
+def copy_and_register(src_path: Path, category: str):
+    """One-off add: opens the DB, registers a single image and closes it"""
+    ingester = MemeIngester()
+    try:
+        return ingester.copy_and_register(src_path, category)
+    finally:
+        ingester.close()
 
 
 def main(argv=None):
-    parser = argparse.ArgumentParser(description="Add an image to media library and register in DB")
-    parser.add_argument("file", help="Path to image file to add")
+    parser = argparse.ArgumentParser(description="Add images to media library and register in DB")
+    parser.add_argument("files", nargs="+", metavar="file", help="Path(s) to image file(s) to add")
     parser.add_argument("category", choices=list(CATEGORY_MAP.keys()), help="Category: memes or calm")
     args = parser.parse_args(argv)
 
     try:
-        new_id, dest_path, new_name = copy_and_register(Path(args.file), args.category)
-        print("Added:")
-        print(f"  id: {new_id}")
-        print(f"  filename: {new_name}")
-        print(f"  path: {dest_path}")
-        print(f"  category: {args.category}")
+        ingester = MemeIngester()
+        try:
+            added = ingester.add_many([Path(f) for f in args.files], args.category)
+        finally:
+            ingester.close()
+        for new_id, dest_path, new_name in added:
+            print("Added:")
+            print(f"  id: {new_id}")
+            print(f"  filename: {new_name}")
+            print(f"  path: {dest_path}")
+            print(f"  category: {args.category}")
         return 0
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
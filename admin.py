@@ -1,4 +1,5 @@
 from config import ADMIN_IDS
+from broadcast import fan_out
 import logging
 
 logger = logging.getLogger(__name__)
@@ -57,19 +58,13 @@ async def handle_broadcast(update, context, db):
         await update.message.reply_text("No active users to broadcast to.")
         return
 
-    success_count = 0
-    fail_count = 0
-
-    for user_id_target in users:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id_target,
-                text=f"📢 Message from bot:\n\n{broadcast_message}",
-            )
-            success_count += 1
-        except Exception as e:
-            fail_count += 1
-            logger.warning(f"Failed to send broadcast to {user_id_target}: {e}")
+    async def send_broadcast(user_id_target):
+        await context.bot.send_message(
+            chat_id=user_id_target,
+            text=f"📢 Message from bot:\n\n{broadcast_message}",
+        )
+
+    success_count, fail_count = await fan_out(users, send_broadcast, label="broadcast")
 
     await update.message.reply_text(
         f"✅ Broadcast sent!\n\nSuccess: {success_count}\nFailed: {fail_count}",
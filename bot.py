@@ -1,5 +1,4 @@
 import logging
-import os
 from datetime import datetime, timedelta
 import datetime as dt
 from telegram import (
@@ -18,12 +17,14 @@ from telegram.ext import (
     filters,
     ConversationHandler,
 )
+from telegram.error import BadRequest
 
 from config import BOT_TOKEN, MOOD_BUTTONS, CHECKIN_COOLDOWN_SECONDS, CHECKIN_DAY, CHECKIN_HOUR
 from storage import Database
 from classifier import MoodClassifier
 from content_loader import ContentLoader
 from admin import handle_stats, handle_broadcast, handle_reload, is_admin
+from broadcast import fan_out
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +36,12 @@ logger = logging.getLogger(__name__)
 # Conversation states
 AWAITING_MOOD_TEXT = 1
 
+# Mood selection keyboard (static, shared by /checkin and the weekly prompt)
+MOOD_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton(label, callback_data=f"mood_{label}")] for label in MOOD_BUTTONS]
+    + [[InlineKeyboardButton("✍️ Type my mood", callback_data="mood_text")]]
+)
+
 # Global instances
 db = Database()
 classifier = MoodClassifier()
@@ -79,18 +86,10 @@ async def checkin_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     # Show mood buttons
     prompt_text = "**How are you feeling right now?**"
 
-    buttons = []
-    for mood_label in MOOD_BUTTONS.keys():
-        buttons.append([InlineKeyboardButton(mood_label, callback_data=f"mood_{mood_label}")])
-
-    buttons.append([InlineKeyboardButton("✍️ Type my mood", callback_data="mood_text")])
-
-    keyboard = InlineKeyboardMarkup(buttons)
-
     if update.message:
-        await update.message.reply_text(prompt_text, reply_markup=keyboard, parse_mode="Markdown")
+        await update.message.reply_text(prompt_text, reply_markup=MOOD_KEYBOARD, parse_mode="Markdown")
     else:
-        await update.callback_query.edit_message_text(prompt_text, reply_markup=keyboard, parse_mode="Markdown")
+        await update.callback_query.edit_message_text(prompt_text, reply_markup=MOOD_KEYBOARD, parse_mode="Markdown")
 
     return AWAITING_MOOD_TEXT
 
@@ -170,6 +169,21 @@ async def mood_text_received(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return ConversationHandler.END
 
 
+async def reply_photo(message, meme, caption=None):
+    """Reply with a meme, reusing Telegram's file_id after the first upload (None if it failed)"""
+    try:
+        sent = await message.reply_photo(content_loader.photo_input(meme), caption=caption)
+    except (FileNotFoundError, BadRequest) as e:
+        # File removed since the last scan/reload (PTB then sends the path as a
+        # file_id) or a stale cached file_id
+        logger.warning(f"Could not send meme {meme}: {e}")
+        content_loader.forget_file_id(meme)
+        return None
+    if sent.photo:
+        content_loader.cache_file_id(meme, sent.photo[-1].file_id)
+    return sent
+
+
 async def send_mood_response(message_or_query, category, response):
     """Send appropriate response based on mood category"""
     text = response.get("text", "Thanks for checking in.")
@@ -181,19 +195,20 @@ async def send_mood_response(message_or_query, category, response):
 
     response_parts = []
 
+    async def send_photo(caption):
+        """One captioned photo; on a button press, first drop the spent mood keyboard"""
+        message = message_or_query.message if is_query else message_or_query
+        if is_query:
+            await message_or_query.edit_message_reply_markup(None)
+        if not await reply_photo(message, meme, caption=caption):
+            # Fall back to a text-only response
+            await message.reply_text(caption)
+
     # Category-specific responses
     if category == "POSITIVE":
-        # Meme + text
-        if meme and os.path.exists(meme):
-            if is_query:
-                await message_or_query.edit_message_text(text)
-            else:
-                await message_or_query.reply_text(text)
-
-            with open(meme, "rb") as photo:
-                if is_query:
-                    await message_or_query.edit_message_media(None)  # Clear message first
-                await (message_or_query.message.reply_photo(photo) if is_query else message_or_query.reply_photo(photo))
+        # Meme with the text as its caption (one photo message)
+        if meme:
+            await send_photo(text)
         else:
             if is_query:
                 await message_or_query.edit_message_text(f"😄 {text}")
@@ -201,20 +216,15 @@ async def send_mood_response(message_or_query, category, response):
                 await message_or_query.reply_text(f"😄 {text}")
 
     elif category == "NEUTRAL_TIRED":
-        # Text + optional image
+        # Text + optional image, sent as one captioned photo when there is one
         response_text = f"😴 {text}"
-        if is_query:
+        if meme:
+            await send_photo(response_text)
+        elif is_query:
             await message_or_query.edit_message_text(response_text)
         else:
             await message_or_query.reply_text(response_text)
 
-        if meme and os.path.exists(meme):
-            with open(meme, "rb") as photo:
-                if is_query:
-                    await message_or_query.message.reply_photo(photo)
-                else:
-                    await message_or_query.reply_photo(photo)
-
     elif category == "SAD_LOW":
         # Text + optional video
         response_text = f"💙 {text}"
@@ -274,31 +284,17 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def weekly_broadcast(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send weekly check-in prompt to all users"""
-    users = db.get_all_active_users()
-
-    success_count = 0
-    fail_count = 0
-
-    for user_id in users:
-        try:
-            buttons = []
-            for mood_label in MOOD_BUTTONS.keys():
-                buttons.append([InlineKeyboardButton(mood_label, callback_data=f"mood_{mood_label}")])
-
-            buttons.append([InlineKeyboardButton("✍️ Type my mood", callback_data="mood_text")])
-
-            keyboard = InlineKeyboardMarkup(buttons)
+    users = db.iter_active_users()
+
+    async def send_prompt(user_id):
+        await context.bot.send_message(
+            chat_id=user_id,
+            text="**🎯 Weekly Mood Check-In**\n\nHow are you feeling this week?\n\n(You can also use /checkin anytime)",
+            reply_markup=MOOD_KEYBOARD,
+            parse_mode="Markdown",
+        )
 
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="**🎯 Weekly Mood Check-In**\n\nHow are you feeling this week?\n\n(You can also use /checkin anytime)",
-                reply_markup=keyboard,
-                parse_mode="Markdown",
-            )
-            success_count += 1
-        except Exception as e:
-            fail_count += 1
-            logger.warning(f"Failed to send weekly prompt to {user_id}: {e}")
+    success_count, fail_count = await fan_out(users, send_prompt, label="weekly prompt")
 
     logger.info(f"Weekly broadcast completed: {success_count} sent, {fail_count} failed")
 
@@ -354,6 +350,12 @@ def main() -> None:
 
     application.post_init = start_schedule
 
+    async def close_db(app):
+        """Close database connections on shutdown"""
+        db.close()
+
+    application.post_shutdown = close_db
+
     # Run bot
     logger.info("Bot started. Running with long polling...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
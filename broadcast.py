@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows ~30 messages/second globally; stay a bit under it
+BROADCAST_CONCURRENCY = 25
+SEND_INTERVAL_SECONDS = 1.0
+
+
+async def fan_out(user_ids, send, label="message", concurrency=BROADCAST_CONCURRENCY):
+    """
+    Call send(user_id) for every user with bounded concurrency.
+
+    `user_ids` may be any iterable; it is consumed lazily, so at most
+    `concurrency` sends are in flight and a generator is never materialized.
+    Each slot is held for at least SEND_INTERVAL_SECONDS, which caps
+    throughput at `concurrency` messages per second. A 429 (RetryAfter) is
+    retried once after the delay Telegram asks for.
+
+    Returns:
+        (success_count, fail_count)
+    """
+    sem = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    counts = {True: 0, False: 0}
+    pending = set()
+
+    async def _send_one(user_id):
+        started = loop.time()
+        ok = False
+        try:
+            try:
+                await send(user_id)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                await send(user_id)
+            ok = True
+        except Exception as e:
+            logger.warning(f"Failed to send {label} to {user_id}: {e}")
+        finally:
+            counts[ok] += 1
+            await asyncio.sleep(max(0.0, started + SEND_INTERVAL_SECONDS - loop.time()))
+            sem.release()
+
+    user_ids = iter(user_ids)
+    done = object()
+    try:
+        while True:
+            # Wait for a free slot before pulling the next id
+            await sem.acquire()
+            user_id = next(user_ids, done)
+            if user_id is done:
+                sem.release()
+                break
+            task = asyncio.create_task(_send_one(user_id))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except Exception:
+        logger.error(
+            f"Stopped reading {label} recipients: {counts[True]} sent, "
+            f"{counts[False]} failed, {len(pending)} still in flight"
+        )
+        raise
+    finally:
+        # Always await in-flight sends, even when the iterator raised
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return counts[True], counts[False]
@@ -4,10 +4,74 @@ import unicodedata
 from config import CONTENT_DIR, MOOD_BUTTONS
 from pathlib import Path
 
+try:
+    import ahocorasick
+except ImportError:  # optional C implementation, fall back to pure Python
+    ahocorasick = None
+
+
+class _KeywordAutomaton:
+    """Minimal pure-Python Aho-Corasick automaton (subset of ahocorasick.Automaton)"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._values = {}
+
+    def __contains__(self, key):
+        node = 0
+        for ch in key:
+            node = self._goto[node].get(ch)
+            if node is None:
+                return False
+        return node in self._values
+
+    def add_word(self, key, value):
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._values[node] = value
+
+    def make_automaton(self):
+        """Compute failure links and merged outputs (breadth-first)"""
+        for node, value in self._values.items():
+            self._out[node] = [value]
+
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def iter(self, text):
+        """Yield (end_index, value) for every keyword occurrence in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for value in out[node]:
+                yield i, value
+
 
 class MoodClassifier:
+    __slots__ = ("_punct_re", "priority", "keywords", "keywords_prepared", "_ac", "_button_label_index")
+
     def __init__(self):
-        self.keywords = self._load_keywords()
+        self._punct_re = re.compile(r'[^\w\s]')
         # Priority order (higher index = higher priority)
         self.priority = [
             "POSITIVE",
@@ -17,22 +81,69 @@ class MoodClassifier:
             "SAD_LOW",
             "HEAVY_DEEP",
         ]
+        self.keywords = self._load_keywords()
+        self._ac = self._build_automaton()
+        # Typed button labels ("Happy", "😄 Happy") map like the button itself
+        self._button_label_index = {
+            self._normalize_text(label): category for label, category in MOOD_BUTTONS.items()
+        }
 
     def _load_keywords(self):
-        """Load keywords from JSON file"""
+        """Load keywords from JSON file and precompute their normalized forms"""
         keywords_file = Path(CONTENT_DIR) / "keywords.json"
         try:
             with open(keywords_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+                keywords = json.load(f)
         except FileNotFoundError:
-            return {}
+            keywords = {}
+
+        # Highest priority first, unknown categories last
+        ordered = [c for c in reversed(self.priority) if c in keywords]
+        ordered += [c for c in keywords if c not in self.priority]
+
+        self.keywords_prepared = {}
+        for category in ordered:
+            prepared = []
+            for keyword in keywords[category]:
+                phrase = self._normalize_text(keyword)
+                prepared.append((phrase, frozenset(phrase.split())))
+            self.keywords_prepared[category] = prepared
+
+        return keywords
+
+    def _build_automaton(self):
+        """
+        Build one multi-pattern automaton over all prepared keywords.
+
+        Full phrases are matched as plain substrings; single words of a phrase
+        are padded with spaces so they only match whole words of the padded
+        input. Values are (priority_index, category), 0 being the highest.
+        """
+        automaton = ahocorasick.Automaton() if ahocorasick else _KeywordAutomaton()
+        has_words = False
+
+        for prio, (category, keywords) in enumerate(self.keywords_prepared.items()):
+            for phrase, word_set in keywords:
+                patterns = [f" {word} " for word in word_set]
+                if phrase:
+                    patterns.append(phrase)
+                for pattern in patterns:
+                    # Keep the first (highest priority) owner of a shared pattern
+                    if pattern not in automaton:
+                        automaton.add_word(pattern, (prio, category))
+                        has_words = True
+
+        if not has_words:
+            return None
+        automaton.make_automaton()
+        return automaton
 
     def _normalize_text(self, text):
         """Normalize text: lowercase, remove punctuation, strip whitespace"""
         # Lowercase
         text = text.lower()
         # Remove punctuation
-        text = re.sub(r'[^\w\s]', ' ', text)
+        text = self._punct_re.sub(' ', text)
         # Remove extra whitespace
         text = ' '.join(text.split())
         return text
@@ -47,31 +158,25 @@ class MoodClassifier:
         Priority: HEAVY_DEEP > SAD_LOW > ANGRY_FRUSTRATED > ANXIOUS_STRESSED > NEUTRAL_TIRED > POSITIVE
         """
         normalized = self._normalize_text(user_text)
-        words = normalized.split()
-
-        # Check each category in reverse priority order (high priority last)
-        matched_categories = set()
-
-        for category, keywords in self.keywords.items():
-            for keyword in keywords:
-                keyword_normalized = self._normalize_text(keyword)
-                # Check if keyword matches (full word or phrase)
-                if keyword_normalized in normalized or any(
-                    kw in words for kw in keyword_normalized.split()
-                ):
-                    matched_categories.add(category)
-                    break
 
-        # Return highest priority category
-        if not matched_categories:
+        # Fast path: the whole message is a mood button label
+        category = self._button_label_index.get(normalized)
+        if category is not None:
+            return category
+
+        if self._ac is None:
             return "NEUTRAL_TIRED"  # Default category
 
-        # Sort by priority and return highest
-        for category in reversed(self.priority):
-            if category in matched_categories:
-                return category
+        best = None
+        for _, (prio, category) in self._ac.iter(f" {normalized} "):
+            if best is None or prio < best[0]:
+                best = (prio, category)
+                if prio == 0:
+                    break
 
-        return list(matched_categories)[0]
+        if best is None:
+            return "NEUTRAL_TIRED"  # Default category
+        return best[1]
 
     def classify(self, mood_input, is_button=False):
         """
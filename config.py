@@ -5,7 +5,7 @@ load_dotenv()
 
 # Bot Configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
-ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
+ADMIN_IDS = frozenset(int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip())
 
 # Timezone
 TIMEZONE = os.getenv("TIMEZONE", "Asia/Qyzylorda")
@@ -17,6 +17,8 @@ LOG_RAW_TEXT = os.getenv("LOG_RAW_TEXT", "false").lower() == "true"
 
 # Database
 DB_PATH = os.getenv("DB_PATH", "mood_bot.db")
+# Opt-in APSW writer connection (requires `pip install apsw`)
+USE_APSW = os.getenv("USE_APSW", "false").lower() == "true"
 
 # Content
 CONTENT_DIR = "content"
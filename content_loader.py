@@ -1,12 +1,31 @@
 import json
+import os
 import random
 from pathlib import Path
 from config import CONTENT_DIR, MEDIA_DIR
 
+MEDIA_SUBDIRS = ("memes", "calm")
+MEME_CATEGORIES = ("POSITIVE", "NEUTRAL_TIRED")
+VIDEO_CATEGORIES = ("SAD_LOW", "ANXIOUS_STRESSED")
+
 
 class ContentLoader:
+    __slots__ = (
+        "_rng",
+        "responses",
+        "_media_set",
+        "_file_ids",
+        "_texts",
+        "_memes_existing",
+        "_videos",
+    )
+
     def __init__(self):
+        self._rng = random.Random()
         self.responses = self._load_responses()
+        self._media_set = self._scan_media()
+        self._file_ids = {}
+        self._build_pools()
 
     def _load_responses(self):
         """Load response content from JSON file"""
@@ -17,9 +36,51 @@ class ContentLoader:
         except FileNotFoundError:
             return {}
 
+    def _scan_media(self):
+        """Collect paths of existing media files (one directory listing per subdir)"""
+        media_set = set()
+        for subdir in MEDIA_SUBDIRS:
+            media_dir = Path(MEDIA_DIR) / subdir
+            try:
+                with os.scandir(media_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            media_set.add(str(media_dir / entry.name))
+            except FileNotFoundError:
+                continue
+        return media_set
+
+    def _build_pools(self):
+        """Precompute per-category texts, existing meme paths and videos"""
+        self._texts = {}
+        self._memes_existing = {}
+        self._videos = {}
+        memes_dir = Path(MEDIA_DIR) / "memes"
+
+        for category, category_data in self.responses.items():
+            self._texts[category] = list(category_data.get("texts") or ())
+
+            # Memes for POSITIVE and NEUTRAL_TIRED only, skipping missing files
+            if category in MEME_CATEGORIES:
+                paths = (str(memes_dir / name) for name in category_data.get("memes") or ())
+                self._memes_existing[category] = [p for p in paths if p in self._media_set]
+
+            # Videos for SAD_LOW, ANXIOUS_STRESSED only
+            if category in VIDEO_CATEGORIES:
+                self._videos[category] = list(category_data.get("videos") or ())
+
+    def _pick(self, pool):
+        """Random element of pool, or None if it is empty"""
+        if not pool:
+            return None
+        return pool[self._rng.randrange(len(pool))]
+
     def reload(self):
         """Reload content from disk (for admin /reload command)"""
         self.responses = self._load_responses()
+        self._media_set = self._scan_media()
+        self._file_ids = {}
+        self._build_pools()
 
     def get_content_for_category(self, category):
         """
@@ -39,35 +100,15 @@ class ContentLoader:
                 "text_id": "default",
             }
 
-        category_data = self.responses[category]
-        
         result = {
-            "text": None,
-            "meme": None,
-            "video": None,
+            "text": self._pick(self._texts.get(category)),
+            "meme": self._pick(self._memes_existing.get(category)),
+            "video": self._pick(self._videos.get(category)),
             "text_id": None,
         }
-
-        # Get random text
-        if "texts" in category_data and category_data["texts"]:
-            result["text"] = random.choice(category_data["texts"])
+        if result["text"] is not None:
             result["text_id"] = f"{category}_text"
 
-        # Get random meme (for POSITIVE and NEUTRAL_TIRED only)
-        if category in ["POSITIVE", "NEUTRAL_TIRED"]:
-            if "memes" in category_data and category_data["memes"]:
-                meme_filename = random.choice(category_data["memes"])
-                meme_path = Path(MEDIA_DIR) / "memes" / meme_filename
-                if meme_path.exists():
-                    result["meme"] = str(meme_path)
-                else:
-                    result["meme"] = None  # File not found, will skip
-
-        # Get random video (for SAD_LOW, ANXIOUS_STRESSED)
-        if category in ["SAD_LOW", "ANXIOUS_STRESSED"]:
-            if "videos" in category_data and category_data["videos"]:
-                result["video"] = random.choice(category_data["videos"])
-
         return result
 
     def get_response_for_mood(self, category):
@@ -101,6 +142,18 @@ class ContentLoader:
         }
         return defaults.get(category, "Thanks for checking in with me.")
 
+    def photo_input(self, media_path):
+        """Telegram file_id for an already uploaded photo, else its local Path"""
+        return self._file_ids.get(media_path) or Path(media_path)
+
+    def cache_file_id(self, media_path, file_id):
+        """Remember the file_id Telegram assigned to an uploaded photo"""
+        self._file_ids[media_path] = file_id
+
+    def forget_file_id(self, media_path):
+        """Drop a cached file_id (e.g. after Telegram rejected it)"""
+        self._file_ids.pop(media_path, None)
+
     def check_media_exists(self, media_path):
         """Check if media file exists"""
         if not media_path:
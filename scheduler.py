@@ -1,3 +1,5 @@
+from datetime import datetime
+from types import MappingProxyType
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from config import TIMEZONE, CHECKIN_DAY, CHECKIN_HOUR
@@ -5,11 +7,27 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Map day names to cron format
+_DAY_MAP = MappingProxyType({
+    "MON": "mon",
+    "TUE": "tue",
+    "WED": "wed",
+    "THU": "thu",
+    "FRI": "fri",
+    "SAT": "sat",
+    "SUN": "sun",
+})
+_TRIGGER_DAY = _DAY_MAP.get(CHECKIN_DAY, "sun")
+if CHECKIN_DAY not in _DAY_MAP:
+    logger.warning(f"Unknown CHECKIN_DAY {CHECKIN_DAY!r}, scheduling on Sunday")
+
 
 class WeeklyScheduler:
     def __init__(self):
         self.scheduler = AsyncIOScheduler(timezone=TIMEZONE)
         self.job_id = None
+        # Cached next fire time; only changes once it has passed
+        self._next_fire = None
 
     def start(self, callback):
         """
@@ -18,31 +36,20 @@ class WeeklyScheduler:
         Args:
             callback: async function to call for weekly broadcast
         """
-        # Map day names to cron format
-        day_map = {
-            "MON": "mon",
-            "TUE": "tue",
-            "WED": "wed",
-            "THU": "thu",
-            "FRI": "fri",
-            "SAT": "sat",
-            "SUN": "sun",
-        }
-
-        trigger_day = day_map.get(CHECKIN_DAY, "sun")
-
-        # Schedule weekly job
-        self.job_id = self.scheduler.add_job(
-            callback,
-            CronTrigger(
-                day_of_week=trigger_day,
-                hour=CHECKIN_HOUR,
-                minute=0,
-                timezone=TIMEZONE,
-            ),
-            id="weekly_checkin",
-            name="Weekly mood check-in broadcast",
-        )
+        # Schedule weekly job (once; repeated starts don't stack duplicates)
+        if self.job_id is None:
+            self.job_id = self.scheduler.add_job(
+                callback,
+                CronTrigger(
+                    day_of_week=_TRIGGER_DAY,
+                    hour=CHECKIN_HOUR,
+                    minute=0,
+                    timezone=TIMEZONE,
+                ),
+                id="weekly_checkin",
+                name="Weekly mood check-in broadcast",
+            )
+            self._next_fire = None
 
         if not self.scheduler.running:
             self.scheduler.start()
@@ -61,9 +68,13 @@ class WeeklyScheduler:
         return self.scheduler.running
 
     def get_next_run_time(self):
-        """Get next scheduled run time"""
+        """Get next scheduled run time (cached until it passes)"""
+        if self._next_fire is not None and datetime.now(self._next_fire.tzinfo) < self._next_fire:
+            return self._next_fire
+
         if self.job_id:
-            job = self.scheduler.get_job(self.job_id)
+            job = self.scheduler.get_job(self.job_id.id)
             if job:
-                return job.next_run_time
+                self._next_fire = job.next_run_time
+                return self._next_fire
         return None
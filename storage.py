@@ -1,177 +1,363 @@
+import queue
 import sqlite3
-from datetime import datetime, timedelta
-from config import DB_PATH, LOG_RAW_TEXT
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from config import DB_PATH, LOG_RAW_TEXT, CHECKIN_COOLDOWN_SECONDS, USE_APSW
+
+if USE_APSW:
+    # Binds parameters straight to the SQLite C API; used for the writer only.
+    # Writes then raise apsw exceptions (e.g. apsw.ConstraintError) instead of
+    # sqlite3 ones, so callers must not rely on catching sqlite3.Error
+    import apsw
+else:
+    apsw = None
+
+# Applied to every connection; journal_mode=WAL also persists in the file
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Page cache per connection, in KiB (negative cache_size). The writer gets the
+# large cache; each pooled reader a smaller one, so the total stays ~128 MB
+# rather than 64 MB x (1 + READ_POOL_SIZE)
+WRITER_CACHE_KIB = 64000
+READER_CACHE_KIB = 16000
+
+# How long a connection waits on a locked database (sqlite3's default)
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Read-only connections kept open next to the single writer
+READ_POOL_SIZE = 4
+
+# How long get_stats may serve a cached result
+STATS_CACHE_SECONDS = 60
+
+# Text format of SQLite's CURRENT_TIMESTAMP
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def compress_mood_raw(text):
+    """zlib-compressed UTF-8 bytes, or the text itself when compression doesn't shrink it"""
+    if not text:
+        return text
+    data = text.encode("utf-8")
+    packed = zlib.compress(data, 3)
+    return packed if len(packed) < len(data) else text
+
+
+def decompress_mood_raw(value):
+    """Inverse of compress_mood_raw; TEXT values (short or older rows) pass through"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def _now():
+    """Current Unix time in whole seconds (patched in tests)"""
+    return int(time.time())
 
 
 class Database:
-    def __init__(self):
-        self.db_path = DB_PATH
+    def __init__(self, db_path=None):
+        self.db_path = db_path if db_path is not None else DB_PATH
+        # A ":memory:" database exists only on its own connection, so it gets
+        # no reader pool and reads go through the writer
+        self._in_memory = self.db_path == ":memory:"
+        # One writer (serialized by a lock) + a small pool of readers; with WAL
+        # readers never block on the writer or on each other
+        self._write_lock = threading.Lock()
+        self._writer = self.get_connection(writer=True)
+        self._readers = queue.Queue()
+        for _ in range(0 if self._in_memory else READ_POOL_SIZE):
+            self._readers.put(self.get_connection())
+        self._stats_cache = None
+        self._stats_cache_ts = 0.0
         self.init_db()
 
-    def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+    def get_connection(self, writer=False):
+        """Open a new tuned connection (autocommit; transactions are explicit)"""
+        uri = ":memory:" if self._in_memory else f"{Path(self.db_path).absolute().as_uri()}?mode=rwc"
+        if writer and apsw is not None:
+            # apsw connections are always autocommit and safe to share across threads
+            conn = apsw.Connection(
+                uri,
+                flags=apsw.SQLITE_OPEN_READWRITE | apsw.SQLITE_OPEN_CREATE | apsw.SQLITE_OPEN_URI,
+            )
+            conn.setbusytimeout(int(BUSY_TIMEOUT_SECONDS * 1000))
+        else:
+            conn = sqlite3.connect(
+                uri, uri=True, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None
+            )
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f"PRAGMA cache_size=-{WRITER_CACHE_KIB if writer else READER_CACHE_KIB}")
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Cursor on the writer connection inside BEGIN IMMEDIATE ... COMMIT"""
+        with self._write_lock:
+            cursor = self._writer.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            else:
+                cursor.execute("COMMIT")
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def _read(self):
+        """Cursor on a pooled reader connection"""
+        if self._in_memory:
+            with self._write_lock:
+                cursor = self._writer.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            return
+
+        conn = self._readers.get()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._readers.put(conn)
+
+    def close(self):
+        """Close the writer and all pooled reader connections"""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
 
     def init_db(self):
         """Initialize database schema"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self._write() as cursor:
+            # Users table
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_checkin_at INTEGER,
+                    timezone TEXT DEFAULT 'Asia/Qyzylorda'
+                )
+            """
+            )
 
-        # Users table
-        cursor.execute(
+            # Check-ins table
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkins (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    input_type TEXT NOT NULL,
+                    -- zlib BLOB, or plain TEXT when compression doesn't shrink it (or
+                    -- older rows); check typeof(mood_raw) or use decompress_mood_raw
+                    mood_raw BLOB,
+                    category TEXT NOT NULL,
+                    response_text_id TEXT,
+                    meme_file TEXT,
+                    video_url TEXT,
+                    FOREIGN KEY (user_id) REFERENCES users (user_id)
+                )
             """
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_checkin_at TIMESTAMP,
-                timezone TEXT DEFAULT 'Asia/Qyzylorda'
             )
-        """
-        )
 
-        # Check-ins table
-        cursor.execute(
+            # last_checkin_at used to hold CURRENT_TIMESTAMP text; it is Unix epoch seconds now
+            cursor.execute(
+                """
+                UPDATE users SET last_checkin_at = CAST(strftime('%s', last_checkin_at) AS INTEGER)
+                WHERE typeof(last_checkin_at) = 'text'
             """
-            CREATE TABLE IF NOT EXISTS checkins (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                input_type TEXT NOT NULL,
-                mood_raw TEXT,
-                category TEXT NOT NULL,
-                response_text_id TEXT,
-                meme_file TEXT,
-                video_url TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
-        """
-        )
 
-        conn.commit()
-        conn.close()
+            # Weekly stats: range seek on created_at, GROUP BY served from the index
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_checkins_created_category ON checkins (created_at, category)"
+            )
 
     def register_user(self, user_id, username=None):
-        """Register or update user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT OR IGNORE INTO users (user_id, username)
-            VALUES (?, ?)
-        """,
-            (user_id, username),
-        )
-
-        conn.commit()
-        conn.close()
+        """Register user or refresh their username; returns (user_id, username, last_checkin_at)"""
+        with self._write() as cursor:
+            # COALESCE rather than a WHERE on DO UPDATE: RETURNING only yields
+            # rows that were actually written, so always touch the row
+            cursor.execute(
+                """
+                INSERT INTO users (user_id, username)
+                VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET username = COALESCE(excluded.username, username)
+                RETURNING user_id, username, last_checkin_at
+            """,
+                (user_id, username),
+            )
+            row = cursor.fetchone()
+        self._stats_cache = None
+        return row
 
     def get_user(self, user_id):
         """Get user info"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
-        conn.close()
-
-        return user
+        with self._read() as cursor:
+            cursor.execute(
+                "SELECT user_id, username, first_seen_at, last_checkin_at, timezone FROM users WHERE user_id = ?",
+                (user_id,),
+            )
+            return cursor.fetchone()
 
     def get_last_checkin(self, user_id):
         """Get user's last check-in timestamp"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT last_checkin_at FROM users WHERE user_id = ?", (user_id,)
-        )
-        result = cursor.fetchone()
-        conn.close()
+        with self._read() as cursor:
+            cursor.execute(
+                "SELECT last_checkin_at FROM users WHERE user_id = ?", (user_id,)
+            )
+            result = cursor.fetchone()
 
         if result and result[0]:
-            return datetime.fromisoformat(result[0])
+            return datetime.fromtimestamp(result[0], timezone.utc)
         return None
 
-    def can_checkin(self, user_id, cooldown_seconds=604800):
+    def can_checkin(self, user_id, cooldown_seconds=CHECKIN_COOLDOWN_SECONDS):
         """Check if user can do a check-in (cooldown: default 7 days)"""
-        last_checkin = self.get_last_checkin(user_id)
+        with self._read() as cursor:
+            cursor.execute(
+                "SELECT last_checkin_at FROM users WHERE user_id = ?", (user_id,)
+            )
+            result = cursor.fetchone()
 
-        if last_checkin is None:
+        if not result or not result[0]:
             return True, None
 
-        time_elapsed = datetime.now() - last_checkin
-        if time_elapsed.total_seconds() >= cooldown_seconds:
+        elapsed = _now() - result[0]
+        if elapsed >= cooldown_seconds:
             return True, None
-
-        time_remaining = timedelta(seconds=cooldown_seconds) - time_elapsed
-        return False, time_remaining
+        return False, timedelta(seconds=cooldown_seconds - elapsed)
 
     def log_checkin(self, user_id, category, input_type, mood_raw=None, response_text_id=None, meme_file=None, video_url=None):
         """Log a completed check-in"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        self.log_checkins_bulk(
+            [(user_id, category, input_type, mood_raw, response_text_id, meme_file, video_url)]
+        )
 
-        # Store raw text only if configured
-        stored_raw = mood_raw if LOG_RAW_TEXT else None
+    def log_checkins_bulk(self, rows):
+        """
+        Log many check-ins in one transaction.
 
-        cursor.execute(
-            """
-            INSERT INTO checkins (user_id, input_type, mood_raw, category, response_text_id, meme_file, video_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-            (user_id, input_type, stored_raw, category, response_text_id, meme_file, video_url),
-        )
+        Args:
+            rows: tuples of (user_id, category, input_type, mood_raw,
+                  response_text_id, meme_file, video_url), as for log_checkin
+        """
+        checkins = [
+            # Store raw text only if configured
+            (user_id, input_type, compress_mood_raw(mood_raw) if LOG_RAW_TEXT else None, category, response_text_id, meme_file, video_url)
+            for user_id, category, input_type, mood_raw, response_text_id, meme_file, video_url in rows
+        ]
+        user_ids = list(dict.fromkeys(row[0] for row in checkins))
+        checked_at = _now()
+
+        with self._write() as cursor:
+            # Users who /checkin without /start still need a row (foreign key)
+            cursor.executemany(
+                "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+                [(user_id,) for user_id in user_ids],
+            )
 
-        # Update user's last_checkin_at
-        cursor.execute(
-            "UPDATE users SET last_checkin_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (user_id,),
-        )
+            cursor.executemany(
+                """
+                INSERT INTO checkins (user_id, input_type, mood_raw, category, response_text_id, meme_file, video_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                checkins,
+            )
 
-        conn.commit()
-        conn.close()
+            # Update users' last_checkin_at
+            cursor.executemany(
+                "UPDATE users SET last_checkin_at = ? WHERE user_id = ?",
+                [(checked_at, user_id) for user_id in user_ids],
+            )
+        self._stats_cache = None
+
+    def iter_active_users(self, chunk=1000):
+        """Yield user ids of everyone who has started the bot, `chunk` rows at a time"""
+        # Keyset paging on the primary key: each page is its own short read,
+        # so no connection (or WAL snapshot) is held while the caller works
+        last_id = None
+        while True:
+            with self._read() as cursor:
+                if last_id is None:
+                    cursor.execute("SELECT user_id FROM users ORDER BY user_id LIMIT ?", (chunk,))
+                else:
+                    cursor.execute(
+                        "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                        (last_id, chunk),
+                    )
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            for (user_id,) in rows:
+                yield user_id
+            if len(rows) < chunk:
+                return
+            last_id = rows[-1][0]
 
     def get_all_active_users(self):
         """Get all users who have started the bot"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT user_id FROM users")
-        users = [row[0] for row in cursor.fetchall()]
-        conn.close()
-
-        return users
+        return list(self.iter_active_users())
 
     def get_stats(self):
-        """Get bot statistics"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        # Total users
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-
-        # Check-ins this week
-        cursor.execute(
-            """
-            SELECT COUNT(*) FROM checkins
-            WHERE created_at >= datetime('now', '-7 days')
-        """
-        )
-        week_checkins = cursor.fetchone()[0]
-
-        # Category breakdown this week
-        cursor.execute(
-            """
-            SELECT category, COUNT(*) as count FROM checkins
-            WHERE created_at >= datetime('now', '-7 days')
-            GROUP BY category
-        """
-        )
-        category_counts = dict(cursor.fetchall())
-
-        conn.close()
+        """Get bot statistics (cached for STATS_CACHE_SECONDS, reset by writes)"""
+        if self._stats_cache is None or time.monotonic() - self._stats_cache_ts >= STATS_CACHE_SECONDS:
+            self._stats_cache = self._compute_stats()
+            self._stats_cache_ts = time.monotonic()
+
+        # Copy so callers can't mutate the cached result
+        return {**self._stats_cache, "category_counts": dict(self._stats_cache["category_counts"])}
+
+    def _compute_stats(self):
+        """Run the stats aggregates"""
+        # Same text format as CURRENT_TIMESTAMP (UTC) so the index range applies
+        cutoff = time.strftime(TIMESTAMP_FORMAT, time.gmtime(_now() - 7 * 24 * 60 * 60))
+
+        with self._read() as cursor:
+            # Total users
+            cursor.execute("SELECT COUNT(*) FROM users")
+            total_users = cursor.fetchone()[0]
+
+            # Check-ins this week
+            cursor.execute(
+                """
+                SELECT COUNT(*) FROM checkins
+                WHERE created_at >= ?
+            """,
+                (cutoff,),
+            )
+            week_checkins = cursor.fetchone()[0]
+
+            # Category breakdown this week
+            cursor.execute(
+                """
+                SELECT category, COUNT(*) as count FROM checkins
+                WHERE created_at >= ?
+                GROUP BY category
+            """,
+                (cutoff,),
+            )
+            category_counts = dict(cursor.fetchall())
 
         return {
             "total_users": total_users,
@@ -8,43 +8,65 @@ Tests critical functionality:
 - Database operations
 """
 
+import asyncio
 import unittest
+from unittest import mock
 import json
-import tempfile
 import os
-from datetime import datetime, timedelta
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 # Add parent to path
 import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from classifier import MoodClassifier
+from classifier import MoodClassifier, _KeywordAutomaton
+import add_meme
+import broadcast
+import storage
+from scheduler import WeeklyScheduler
 from storage import Database
+from telegram.error import RetryAfter
+
+try:
+    import apsw
+except ImportError:
+    apsw = None
 
 
 class TestMoodClassifier(unittest.TestCase):
     """Test mood classification logic"""
 
-    def setUp(self):
-        """Initialize classifier"""
-        self.classifier = MoodClassifier()
-
-    def test_button_classification(self):
-        """Test button-based mood classification"""
-        assert self.classifier.classify("😄 Happy", is_button=True) == "POSITIVE"
-        assert self.classifier.classify("😴 Tired", is_button=True) == "NEUTRAL_TIRED"
-        assert self.classifier.classify("😔 Sad", is_button=True) == "SAD_LOW"
-        assert self.classifier.classify("😡 Angry", is_button=True) == "ANGRY_FRUSTRATED"
-        assert self.classifier.classify("😰 Anxious", is_button=True) == "ANXIOUS_STRESSED"
-
-    def test_text_classification(self):
-        """Test text-based mood classification"""
-        assert self.classifier.classify_text_mood("I feel happy") == "POSITIVE"
-        assert self.classifier.classify_text_mood("I'm so sad") == "SAD_LOW"
-        assert self.classifier.classify_text_mood("I'm anxious") == "ANXIOUS_STRESSED"
-        assert self.classifier.classify_text_mood("I'm tired") == "NEUTRAL_TIRED"
-        assert self.classifier.classify_text_mood("I'm angry") == "ANGRY_FRUSTRATED"
+    @classmethod
+    def setUpClass(cls):
+        """Initialize classifier once for all tests"""
+        cls.classifier = MoodClassifier()
+
+    def test_classification(self):
+        """Test button-based, text-based and typed-label classification"""
+        cases = [
+            ("😄 Happy", {"is_button": True}, "POSITIVE"),
+            ("😴 Tired", {"is_button": True}, "NEUTRAL_TIRED"),
+            ("😔 Sad", {"is_button": True}, "SAD_LOW"),
+            ("😡 Angry", {"is_button": True}, "ANGRY_FRUSTRATED"),
+            ("😰 Anxious", {"is_button": True}, "ANXIOUS_STRESSED"),
+            ("I feel happy", {}, "POSITIVE"),
+            ("I'm so sad", {}, "SAD_LOW"),
+            ("I'm anxious", {}, "ANXIOUS_STRESSED"),
+            ("I'm tired", {}, "NEUTRAL_TIRED"),
+            ("I'm angry", {}, "ANGRY_FRUSTRATED"),
+            # Typing a button label classifies like the button
+            ("Happy", {}, "POSITIVE"),
+            ("😴 Tired", {}, "NEUTRAL_TIRED"),
+            ("🕳️ Empty", {}, "HEAVY_DEEP"),
+        ]
+        for case in cases:
+            mood_input, kwargs, expected = case
+            with self.subTest(case=case):
+                self.assertEqual(self.classifier.classify(mood_input, **kwargs), expected)
 
     def test_priority_ordering(self):
         """Test that HEAVY_DEEP has highest priority"""
@@ -56,6 +78,18 @@ class TestMoodClassifier(unittest.TestCase):
         result = self.classifier.classify_text_mood("I'm sad but also motivated")
         assert result == "SAD_LOW", f"Expected SAD_LOW, got {result}"
 
+    def test_mixed_keywords(self):
+        """Test that the highest priority match wins in a single scan"""
+        assert self.classifier.classify_text_mood("tired but anxious") == "ANXIOUS_STRESSED"
+
+    def test_keyword_automaton_overlaps(self):
+        """Test that the fallback automaton reports overlapping matches"""
+        automaton = _KeywordAutomaton()
+        for i, word in enumerate(["he", "she", "hers"]):
+            automaton.add_word(word, i)
+        automaton.make_automaton()
+        assert sorted(automaton.iter("ushers")) == [(3, 0), (3, 1), (5, 2)]
+
     def test_text_normalization(self):
         """Test that text normalization works"""
         # Different punctuation should match same keyword
@@ -80,24 +114,12 @@ class TestDatabase(unittest.TestCase):
     """Test database operations"""
 
     def setUp(self):
-        """Create temporary database for testing"""
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix=".db")
-        self.temp_db.close()
-        self.db_path = self.temp_db.name
-        
-        # Monkey-patch DB_PATH
-        import config
-        original_db_path = config.DB_PATH
-        config.DB_PATH = self.db_path
-        
-        self.db = Database()
-        self.original_db_path = original_db_path
+        """Create in-memory database for testing"""
+        self.db = Database(db_path=":memory:")
 
     def tearDown(self):
-        """Clean up temporary database"""
-        import config
-        config.DB_PATH = self.original_db_path
-        os.unlink(self.db_path)
+        """Close the database"""
+        self.db.close()
 
     def test_user_registration(self):
         """Test user registration"""
@@ -111,6 +133,15 @@ class TestDatabase(unittest.TestCase):
         assert user[0] == user_id
         assert user[1] == username
 
+    def test_register_user_refreshes_username(self):
+        """Test that re-registering updates the username and returns the row"""
+        user_id = 123456780
+
+        assert self.db.register_user(user_id, "old_name") == (user_id, "old_name", None)
+        assert self.db.register_user(user_id, "new_name") == (user_id, "new_name", None)
+        # No username (e.g. hidden) keeps the stored one
+        assert self.db.register_user(user_id) == (user_id, "new_name", None)
+
     def test_first_checkin_allowed(self):
         """Test that first check-in is always allowed"""
         user_id = 111111111
@@ -122,25 +153,51 @@ class TestDatabase(unittest.TestCase):
     def test_rate_limiting(self):
         """Test that rate limit is enforced"""
         user_id = 222222222
-        
+        checked_in_at = int(datetime(2026, 1, 4, 18, 0, tzinfo=timezone.utc).timestamp())
+
         # Register user
         self.db.register_user(user_id)
-        
+
         # First check-in should work
         can_checkin, _ = self.db.can_checkin(user_id)
         assert can_checkin is True
-        
+
         # Log check-in
-        self.db.log_checkin(user_id, "POSITIVE", "button")
-        
-        # Second check-in same week should fail
-        can_checkin, remaining = self.db.can_checkin(user_id)
+        with mock.patch.object(storage, "_now", return_value=checked_in_at):
+            self.db.log_checkin(user_id, "POSITIVE", "button")
+
+        # Second check-in 6 hours later should fail
+        with mock.patch.object(storage, "_now", return_value=checked_in_at + 6 * 60 * 60):
+            can_checkin, remaining = self.db.can_checkin(user_id)
         assert can_checkin is False
-        assert remaining is not None
-        
-        # Remaining time should be approximately 7 days
-        remaining_hours = remaining.total_seconds() / 3600
-        assert 160 < remaining_hours < 170  # ~7 days in hours
+        self.assertEqual(remaining, timedelta(days=7) - timedelta(hours=6))
+
+        # Still blocked one second before the cooldown ends
+        with mock.patch.object(storage, "_now", return_value=checked_in_at + 7 * 24 * 60 * 60 - 1):
+            can_checkin, remaining = self.db.can_checkin(user_id)
+        assert can_checkin is False
+        self.assertEqual(remaining, timedelta(seconds=1))
+
+        # Allowed again once the 7 days are up
+        with mock.patch.object(storage, "_now", return_value=checked_in_at + 7 * 24 * 60 * 60):
+            can_checkin, remaining = self.db.can_checkin(user_id)
+        assert can_checkin is True
+        assert remaining is None
+
+    def test_text_last_checkin_migrated(self):
+        """Test that old CURRENT_TIMESTAMP text values become epoch seconds"""
+        user_id = 777777777
+        with self.db._write() as cursor:
+            cursor.execute(
+                "INSERT INTO users (user_id, last_checkin_at) VALUES (?, ?)",
+                (user_id, "2026-01-04 18:00:00"),
+            )
+
+        self.db.init_db()
+
+        expected = datetime(2026, 1, 4, 18, 0, tzinfo=timezone.utc)
+        assert self.db.get_user(user_id)[3] == int(expected.timestamp())
+        assert self.db.get_last_checkin(user_id) == expected
 
     def test_checkin_logging(self):
         """Test check-in logging"""
@@ -154,6 +211,39 @@ class TestDatabase(unittest.TestCase):
         stats = self.db.get_stats()
         assert stats["week_checkins"] >= 1
 
+    def test_mood_raw_compressed(self):
+        """Test that raw mood text is stored compressed and reads back intact"""
+        user_id = 888888888
+        long_text = "Мне очень грустно и тревожно сегодня, " * 5
+
+        with mock.patch.object(storage, "LOG_RAW_TEXT", True):
+            self.db.log_checkin(user_id, "SAD_LOW", "text", mood_raw=long_text)
+            self.db.log_checkin(user_id, "SAD_LOW", "text", mood_raw="sad")
+
+        with self.db._read() as cursor:
+            cursor.execute("SELECT mood_raw FROM checkins WHERE user_id = ? ORDER BY id", (user_id,))
+            stored = [row[0] for row in cursor.fetchall()]
+
+        assert isinstance(stored[0], bytes)
+        assert len(stored[0]) < len(long_text.encode("utf-8"))
+        # Too short to benefit, kept as plain text
+        assert stored[1] == "sad"
+        assert [storage.decompress_mood_raw(value) for value in stored] == [long_text, "sad"]
+
+    def test_bulk_checkin_logging(self):
+        """Test logging several check-ins in one call"""
+        user_ids = [666666661, 666666662]
+        before = self.db.get_stats()["week_checkins"]
+
+        self.db.log_checkins_bulk(
+            [(uid, "POSITIVE", "button", None, None, None, None) for uid in user_ids]
+        )
+
+        assert self.db.get_stats()["week_checkins"] == before + 2
+        for uid in user_ids:
+            can_checkin, _ = self.db.can_checkin(uid)
+            assert can_checkin is False
+
     def test_get_all_users(self):
         """Test getting all active users"""
         user_ids = [111, 222, 333]
@@ -166,6 +256,15 @@ class TestDatabase(unittest.TestCase):
         for uid in user_ids:
             assert uid in all_users
 
+    def test_iter_active_users_pages(self):
+        """Test that iterating in small pages still yields every user once"""
+        user_ids = [5, 1, 4, 2, 3]
+
+        for uid in user_ids:
+            self.db.register_user(uid)
+
+        assert list(self.db.iter_active_users(chunk=2)) == sorted(user_ids)
+
     def test_stats_calculation(self):
         """Test statistics calculation"""
         user_id = 444444444
@@ -181,6 +280,295 @@ class TestDatabase(unittest.TestCase):
         assert "POSITIVE" in stats["category_counts"]
         assert "SAD_LOW" in stats["category_counts"]
 
+    def test_stats_cache_invalidated_by_checkin(self):
+        """Test that a new check-in shows up in cached stats"""
+        user_id = 555555555
+
+        self.db.register_user(user_id)
+        before = self.db.get_stats()["week_checkins"]
+        self.db.log_checkin(user_id, "POSITIVE", "button")
+
+        assert self.db.get_stats()["week_checkins"] == before + 1
+
+    def test_stats_cached_until_expiry(self):
+        """Test that stats are served from cache until STATS_CACHE_SECONDS pass"""
+        user_id = 555555556
+        self.db.log_checkin(user_id, "POSITIVE", "button")
+        stats = self.db.get_stats()
+        assert stats["week_checkins"] == 1
+
+        # Direct write bypasses the invalidation in log_checkin
+        with self.db._write() as cursor:
+            cursor.execute(
+                "INSERT INTO checkins (user_id, input_type, category) VALUES (?, ?, ?)",
+                (user_id, "button", "SAD_LOW"),
+            )
+        assert self.db.get_stats()["week_checkins"] == 1
+
+        # Callers get a copy; mutating it leaves the cache intact
+        stats["category_counts"]["POSITIVE"] = 99
+        assert self.db.get_stats()["category_counts"] == {"POSITIVE": 1}
+
+        expired = time.monotonic() + storage.STATS_CACHE_SECONDS + 1
+        with mock.patch.object(storage.time, "monotonic", return_value=expired):
+            stats = self.db.get_stats()
+        assert stats["week_checkins"] == 2
+        assert stats["category_counts"] == {"POSITIVE": 1, "SAD_LOW": 1}
+
+
+class TestFileDatabase(unittest.TestCase):
+    """Test the file-backed path: URI connections, reader pool and WAL"""
+
+    def setUp(self):
+        """Create a database file in a temporary directory"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "mood_bot.db")
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        self.tmpdir.cleanup()
+
+    def check_round_trip(self, db):
+        """Write through the writer and read back through the pooled readers"""
+        user_id = 999999999
+        checked_in_at = int(datetime(2026, 1, 4, 18, 0, tzinfo=timezone.utc).timestamp())
+
+        db.register_user(user_id, "fileuser")
+        with mock.patch.object(storage, "_now", return_value=checked_in_at):
+            db.log_checkin(user_id, "POSITIVE", "button")
+
+        # Use every reader in the pool so each one sees the committed writes
+        for _ in range(storage.READ_POOL_SIZE):
+            user = db.get_user(user_id)
+            assert user[:2] == (user_id, "fileuser")
+            assert user[3] == checked_in_at
+
+        with mock.patch.object(storage, "_now", return_value=checked_in_at + 60):
+            can_checkin, remaining = db.can_checkin(user_id)
+        assert can_checkin is False
+        self.assertEqual(remaining, timedelta(days=7) - timedelta(seconds=60))
+
+        stats = db.get_stats()
+        assert stats["total_users"] == 1
+        assert stats["category_counts"] == {"POSITIVE": 1}
+
+    def test_file_database(self):
+        """Test writes and pooled reads against a database file"""
+        db = Database(db_path=self.db_path)
+        try:
+            assert db._readers.qsize() == storage.READ_POOL_SIZE
+            self.check_round_trip(db)
+        finally:
+            db.close()
+
+        # Data survives reopening the file
+        db = Database(db_path=self.db_path)
+        try:
+            assert db.get_user(999999999) is not None
+        finally:
+            db.close()
+
+    @unittest.skipIf(apsw is None, "apsw not installed")
+    def test_file_database_apsw_writer(self):
+        """Test an apsw writer alongside sqlite3 readers"""
+        with mock.patch.object(storage, "apsw", apsw):
+            db = Database(db_path=self.db_path)
+        try:
+            assert isinstance(db._writer, apsw.Connection)
+            self.check_round_trip(db)
+        finally:
+            db.close()
+
+
+class TestBroadcastFanOut(unittest.IsolatedAsyncioTestCase):
+    """Test bounded-concurrency broadcast sending"""
+
+    async def test_fan_out(self):
+        """Test counts, RetryAfter retry, concurrency cap and lazy iteration"""
+        n, concurrency = 20, 3
+        pulled = []
+        attempts = {}
+        in_flight = peak = pulled_ahead = 0
+
+        def user_ids():
+            for user_id in range(n):
+                pulled.append(user_id)
+                yield user_id
+
+        async def send(user_id):
+            nonlocal in_flight, peak, pulled_ahead
+            attempts[user_id] = attempts.get(user_id, 0) + 1
+            pulled_ahead = max(pulled_ahead, len(pulled) - user_id)
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(0)
+                if user_id == 1 and attempts[user_id] == 1:
+                    raise RetryAfter(0)
+                if user_id == 2:
+                    raise ValueError("blocked by user")
+            finally:
+                in_flight -= 1
+
+        with mock.patch.object(broadcast, "SEND_INTERVAL_SECONDS", 0.001):
+            result = await broadcast.fan_out(user_ids(), send, concurrency=concurrency)
+
+        assert result == (n - 1, 1)
+        assert attempts[1] == 2
+        assert attempts[2] == 1
+        assert 1 < peak <= concurrency
+        # Only ids with a free slot were pulled from the generator
+        assert pulled_ahead <= concurrency
+        assert pulled == list(range(n))
+
+    async def test_fan_out_iterator_error(self):
+        """Test that in-flight sends are awaited when the iterator raises"""
+        finished = []
+
+        def user_ids():
+            yield 1
+            yield 2
+            raise RuntimeError("page query failed")
+
+        async def send(user_id):
+            await asyncio.sleep(0.01)
+            finished.append(user_id)
+
+        with mock.patch.object(broadcast, "SEND_INTERVAL_SECONDS", 0.001):
+            with self.assertRaises(RuntimeError):
+                await broadcast.fan_out(user_ids(), send, concurrency=5)
+
+        assert sorted(finished) == [1, 2]
+
+
+class TestWeeklyScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test the weekly check-in scheduler"""
+
+    async def asyncSetUp(self):
+        """Create a scheduler"""
+        self.scheduler = WeeklyScheduler()
+
+    async def asyncTearDown(self):
+        """Stop the scheduler"""
+        self.scheduler.stop()
+
+    async def callback(self):
+        """Stand-in for the weekly broadcast"""
+
+    async def test_next_run_time_cached(self):
+        """Test that the next run time comes from the job and is then cached"""
+        self.scheduler.start(self.callback)
+
+        next_run = self.scheduler.get_next_run_time()
+        assert next_run is not None
+        assert next_run == self.scheduler.scheduler.get_job("weekly_checkin").next_run_time
+        assert self.scheduler.get_next_run_time() is next_run
+
+    async def test_start_idempotent(self):
+        """Test that starting twice schedules a single job"""
+        self.scheduler.start(self.callback)
+        self.scheduler.start(self.callback)
+
+        assert len(self.scheduler.scheduler.get_jobs()) == 1
+
+
+class TestMemeLibraryIndex(unittest.TestCase):
+    """Test the registered-filename index lookup in add_meme"""
+
+    def setUp(self):
+        """Create an in-memory meme_library"""
+        self.conn = sqlite3.connect(":memory:")
+        self.cur = self.conn.cursor()
+        add_meme.init_db(self.cur)
+
+    def tearDown(self):
+        """Close the connection"""
+        self.conn.close()
+
+    def register(self, category, *filenames):
+        """Insert library rows for the given filenames"""
+        self.cur.executemany(
+            "INSERT INTO meme_library (filename, category, original_name, added_at) VALUES (?, ?, ?, ?)",
+            [(name, category, name, "2026-01-04T18:00:00+00:00") for name in filenames],
+        )
+
+    def test_nothing_registered(self):
+        """Test that an empty library gives None"""
+        assert add_meme.max_db_index(self.cur, "memes", "positive", ".jpg") is None
+
+    def test_extension_and_category_filtered(self):
+        """Test that only prefix_NNN.ext rows in the category count"""
+        self.register("memes", "positive_001.jpg", "positive_007.jpg", "positive_009.png", "positive_0100.jpg")
+        self.register("calm", "positive_050.jpg")
+
+        assert add_meme.max_db_index(self.cur, "memes", "positive", ".jpg") == 7
+        assert add_meme.max_db_index(self.cur, "memes", "positive", ".png") == 9
+        assert add_meme.max_db_index(self.cur, "memes", "positive", ".gif") is None
+
+    def test_like_wildcards_escaped(self):
+        """Test that _ and % in the prefix match only themselves"""
+        self.register("memes", "a_b_003.jpg", "axb_005.jpg", "50%_002.jpg", "50x_008.jpg", "5000_009.jpg")
+
+        assert add_meme.max_db_index(self.cur, "memes", "a_b", ".jpg") == 3
+        assert add_meme.max_db_index(self.cur, "memes", "50%", ".jpg") == 2
+
+
+class TestMemeIngester(unittest.TestCase):
+    """Test batch ingestion into the media library"""
+
+    def setUp(self):
+        """Temporary media dir, library DB and source images"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        media_patch = mock.patch.object(add_meme, "MEDIA_DIR", root / "media")
+        media_patch.start()
+        self.addCleanup(media_patch.stop)
+        self.ingester = add_meme.MemeIngester(db_path=root / "meme_library.db")
+        self.sources = []
+        for name in ("a.jpg", "b.png", "c.jpg"):
+            path = root / name
+            path.write_bytes(b"image")
+            self.sources.append(path)
+
+    def tearDown(self):
+        """Close the DB and remove the temporary directory"""
+        self.ingester.close()
+        self.tmpdir.cleanup()
+
+    def library_rows(self):
+        """All (id, filename, original_name) rows"""
+        return self.ingester.conn.execute(
+            "SELECT id, filename, original_name FROM meme_library ORDER BY id"
+        ).fetchall()
+
+    def test_add_many_ids(self):
+        """Test that returned ids match the stored rows"""
+        self.ingester.add_many(self.sources[:1], "memes")
+        added = self.ingester.add_many(self.sources, "memes")
+
+        assert [(new_id, new_name) for new_id, _, new_name in added] == [
+            (2, "positive_002.jpg"),
+            (3, "positive_001.png"),
+            (4, "positive_003.jpg"),
+        ]
+        assert self.library_rows()[1:] == [
+            (2, "positive_002.jpg", "a.jpg"),
+            (3, "positive_001.png", "b.png"),
+            (4, "positive_003.jpg", "c.jpg"),
+        ]
+        for _, dest_path, _ in added:
+            assert dest_path.is_file()
+
+    def test_add_many_rolls_back(self):
+        """Test that a failing batch leaves no files and no rows behind"""
+        missing = Path(self.tmpdir.name) / "missing.jpg"
+
+        with self.assertRaises(FileNotFoundError):
+            self.ingester.add_many([self.sources[0], missing], "memes")
+
+        assert list((add_meme.MEDIA_DIR / "memes").iterdir()) == []
+        assert self.library_rows() == []
+
 
 class TestRateLimitCalculation(unittest.TestCase):
     """Test rate limit time calculations"""
@@ -227,18 +615,11 @@ def run_tests():
     """Run all tests"""
     print("🧪 Running Mood Bot MVP Tests...\n")
     
-    # Create test suite
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-    
-    # Add all test classes
-    suite.addTests(loader.loadTestsFromTestCase(TestMoodClassifier))
-    suite.addTests(loader.loadTestsFromTestCase(TestDatabase))
-    suite.addTests(loader.loadTestsFromTestCase(TestRateLimitCalculation))
-    suite.addTests(loader.loadTestsFromTestCase(TestConfigurationPriority))
+    # Collect every TestCase in this module
+    suite = unittest.defaultTestLoader.loadTestsFromModule(sys.modules[__name__])
     
     # Run tests
-    runner = unittest.TextTestRunner(verbosity=2)
+    runner = unittest.TextTestRunner(verbosity=1, buffer=True)
     result = runner.run(suite)
     
     # Print summary